@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import hashlib
+import mmap
 import os
 import subprocess
 import sys
@@ -9,18 +10,45 @@ from pathlib import Path
 CACHEDIR = Path(".cache")
 
 
+def cache_key(args):
+    # Same digest as hashing the space-joined command line, so that existing
+    # cache files stay valid.
+    h = hashlib.md5()
+    for i, arg in enumerate(args):
+        if i:
+            h.update(b" ")
+        h.update(arg.encode("utf-8"))
+    return h.hexdigest()
+
+
 def main(args):
-    spec = hashlib.md5(" ".join(args).encode("utf-8")).hexdigest()
+    spec = cache_key(args)
 
     CACHEDIR.mkdir(exist_ok=True)
 
     cache = (CACHEDIR / spec).with_suffix(".tex")
     sys.stderr.write(f"Using cache file at {cache}\n")
     if not cache.exists() or os.environ.get("NOCACHE"):
-        out = subprocess.run(args, capture_output=True)
-        cache.write_bytes(out.stdout)
-
-    sys.stdout.write(cache.read_text())
+        # Write to a private temporary file and rename it into place, so that
+        # concurrent builds never read a partially written cache file. The
+        # command's stderr is passed through, so failures show in the log.
+        tmp = cache.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with tmp.open("wb") as out:
+                subprocess.run(args, stdout=out, check=True)
+            os.replace(tmp, cache)
+        except subprocess.CalledProcessError as e:
+            sys.exit(e.returncode)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    with cache.open("rb") as fh:
+        # Map the file instead of reading it, so that the output is served
+        # straight from the page cache shared by parallel builds. Empty files
+        # cannot be mapped, and have nothing to write anyway.
+        if os.fstat(fh.fileno()).st_size:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                sys.stdout.buffer.write(mm)
 
 
 if __name__ == "__main__":
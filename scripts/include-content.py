@@ -6,19 +6,24 @@ import re
 
 def print_includes(directory, only, exclude, use_include=True):
     if os.path.exists(directory):
-        for f in sorted(os.listdir(directory)):
-            f, ext = f.rsplit(".", 1)
-            if only and not re.fullmatch(only, f):
+        only = re.compile(only) if only else None
+        exclude = re.compile(exclude) if exclude else None
+        with os.scandir(directory) as it:
+            names = sorted(e.name for e in it if e.is_file())
+        for name in names:
+            f, dot, ext = name.rpartition(".")
+            if not dot or ext != "tex":
                 continue
-            if exclude and re.fullmatch(exclude, f):
+            if only and not only.fullmatch(f):
                 continue
-            if ext == "tex":
-                print(
-                    r"\{}{{{}}}".format(
-                        "include" if use_include else "input",
-                        os.path.join(directory, f),
-                    )
+            if exclude and exclude.fullmatch(f):
+                continue
+            print(
+                r"\{}{{{}}}".format(
+                    "include" if use_include else "input",
+                    os.path.join(directory, f),
                 )
+            )
 
 
 # Click version removed for compatibility with overleaf
@@ -10,33 +10,50 @@ def quote_header(k):
     return k.replace(" ", "").replace("_", "")
 
 
+_ESCAPE = str.maketrans({"%": r"\%", "#": r"\#", "&": r"\&"})
+
+
 def quote_value(v):
-    t = v.strip().replace("%", r"\%").replace("#", r"\#").replace("&", r"\&")
-    return t
+    return v.strip().translate(_ESCAPE)
+
+
+class LaTeXWriter:
+    """Writes the selected columns of list rows, escaping LaTeX specials."""
+
+    def __init__(self, f, columns):
+        self.writer = csv.writer(f)
+        self.columns = columns
 
+    def writeheader(self, fieldnames):
+        return self.writer.writerow([quote_header(fieldnames[i]) for i in self.columns])
 
-class LaTeXDictWriter(csv.DictWriter):
-    def writeheader(self):
-        return super().writerow({k: quote_header(k) for k in self.fieldnames})
+    def writerow(self, row):
+        return self.writer.writerow([quote_value(row[i]) for i in self.columns])
 
-    def writerow(self, data):
-        return super().writerow({k: quote_value(v) for k, v in data.items()})
+
+def parse_specs(specs, index):
+    """Parse ``key:value`` specs into ``(column index, value)`` pairs."""
+    return [(index[key], value) for key, value in (s.split(":", 1) for s in specs)]
 
 
 def keeprow(row, filters, excludes):
-    for f in filters:
-        key, value = f.split(":")
-        if row[key] != value:
+    for i, value in filters:
+        if row[i] != value:
             return False
-    for e in excludes:
-        key, value = e.split(":")
-        if row[key] == value:
+    for i, value in excludes:
+        if row[i] == value:
             return False
     return True
 
 
-def iterrows(reader, filters, excludes):
+def iterrows(reader, width, index, filters, excludes):
+    filters = parse_specs(filters, index)
+    excludes = parse_specs(excludes, index)
     for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row += [""] * (width - len(row))
         if keeprow(row, filters, excludes):
             yield row
 
@@ -69,9 +86,16 @@ def itermonths(from_date, to_date, frequency=1):
 @click.argument("fh", type=click.File("r"))
 @click.argument("name")
 def main(fh, name, from_date, to_date, filters, excludes, date_ticks):
-    reader = csv.DictReader(fh)
+    # Also write through sys.stdout (not __stdout__), so that the CSV rows
+    # share the block buffer with the surrounding print() calls.
+    sys.stdout.reconfigure(line_buffering=False)
+
+    reader = csv.reader(fh)
+    fieldnames = next(reader)
+    # Field name to column index; like DictReader, the last duplicate wins.
+    index = {k: i for i, k in enumerate(fieldnames)}
 
-    writer = LaTeXDictWriter(sys.__stdout__, [f for f in reader.fieldnames if f])
+    writer = LaTeXWriter(sys.stdout, [i for i, f in enumerate(fieldnames) if f])
 
     print(
         r"""\pgfplotstableread[
@@ -81,7 +105,7 @@ def main(fh, name, from_date, to_date, filters, excludes, date_ticks):
 ]{"""
     )
 
-    writer.writeheader()
+    writer.writeheader(fieldnames)
 
     if date_ticks:
         date_field, frequency = date_ticks.split(":")
@@ -109,16 +133,18 @@ def main(fh, name, from_date, to_date, filters, excludes, date_ticks):
             to_date = datetime.date.fromisoformat(to_date)
             max_date = to_date
 
-    for row in iterrows(reader, filters, excludes):
+    if date_ticks:
+        date_index = index[date_field]
+
+    for row in iterrows(reader, len(fieldnames), index, filters, excludes):
         if date_ticks:
-            date = datetime.date.fromisoformat(row[date_field])
+            date = datetime.date.fromisoformat(row[date_index])
             if from_date and date < from_date:
                 continue
             if to_date and date > to_date:
                 continue
             min_date = date if min_date is None else min(date, min_date)
             max_date = date if max_date is None else max(date, max_date)
-        row.pop('', None)
         writer.writerow(row)
 
     print(rf"}}\{name}")
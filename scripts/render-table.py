@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 
 import csv
+import math
 import re
+import sys
+from bisect import bisect_right
 from decimal import ROUND_DOWN
 from decimal import Decimal as D
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 
 import click
 from attrs import define, field
@@ -12,9 +18,13 @@ from natsort import natsorted
 from slugify import slugify
 
 
+_REFS_RE = re.compile(r"\((?:[\d\.]+[,;] ?)*[\d\.]+\)")
+_NUM_RE = re.compile(r"[\d\.]+")
+
+
 def replacerefs(text, prefix, label=""):
     def repl(match):
-        refs = natsorted(re.findall(r"[\d\.]+", match.group(0)))
+        refs = natsorted(_NUM_RE.findall(match.group(0)))
         refs = ", ".join(
             [
                 r"\hyperref[%s:%s]{\textcolor{blue}{%s%s}}" % (prefix, n, label, n)
@@ -23,26 +33,37 @@ def replacerefs(text, prefix, label=""):
         )
         return f"({refs})"
 
-    text = re.sub(r"\((?:[\d\.]+[,;] ?)*[\d\.]+\)", repl, text)
+    text = _REFS_RE.sub(repl, text)
     return text
 
 
-def replaceglossary(text, glossary):
-    import csv
-
+@lru_cache(maxsize=8)
+def _load_glossary(glossary):
     with open(glossary) as fh:
         reader = csv.reader(fh)
         rows = iter(reader)
         next(rows)
         terms = [r[0].strip() for r in reader]
 
-    for term in terms:
-        text = re.sub(
-            f"([^a-zA-Z]){term}([^a-zA-Z])",
-            r"\1\\gls[hyper=true]{%s}\2" % slugify(term),
-            text,
-        )
-    return text
+    if not terms:
+        return None, {}
+
+    # Longest terms first, so that a term is preferred over its prefixes.
+    terms = sorted(set(terms), key=len, reverse=True)
+    pattern = re.compile(
+        r"(?<=[^a-zA-Z])(%s)(?=[^a-zA-Z])" % "|".join(re.escape(t) for t in terms)
+    )
+    return pattern, {term: slugify(term) for term in terms}
+
+
+def replaceglossary(text, glossary):
+    pattern, slugs = _load_glossary(glossary)
+    if pattern is None:
+        return text
+    return pattern.sub(
+        lambda m: r"\gls[hyper=true]{%s}" % slugs[m.group(1)],
+        text,
+    )
 
 
 class Ref:
@@ -79,6 +100,28 @@ class Span:
 @define
 class Spans:
     spans: list[Span] = field(factory=list)
+    _starts: list = field(init=False, repr=False, eq=False)
+    _ends: list = field(init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        # Merge the spans into sorted, disjoint intervals, so that membership
+        # can be tested with a binary search on the start positions.
+        self._starts, self._ends = [], []
+        intervals = [
+            (
+                -math.inf if span.start is None else span.start,
+                math.inf if span.end is None else span.end,
+            )
+            for span in self.spans
+        ]
+        for start, end in sorted(intervals):
+            if start >= end:
+                continue
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
 
     @classmethod
     def all(cls):
@@ -90,10 +133,8 @@ class Spans:
         return cls(spans)
 
     def __contains__(self, i):
-        for span in self.spans:
-            if i in span:
-                return True
-        return False
+        idx = bisect_right(self._starts, i) - 1
+        return idx >= 0 and i < self._ends[idx]
 
     def filter(self, iterable):
         for i, value in enumerate(iterable):
@@ -101,6 +142,7 @@ class Spans:
                 yield value
 
 
+@define
 class RowSpans(Spans):
     def __contains__(self, cell):
         row, col = cell
@@ -109,6 +151,7 @@ class RowSpans(Spans):
         return super().__contains__(row)
 
 
+@define
 class ColSpans(Spans):
     def __contains__(self, cell):
         row, col = cell
@@ -120,48 +163,101 @@ class ColSpans(Spans):
 @define(kw_only=True)
 class WrapperBase:
     priority = 100
+    # Whether apply() can turn an empty cell into a non-empty one.
+    fills_empty = False
     spans: Spans = field()
 
-    def wrap(self, cell, value):
-        if cell in self.spans:
-            value = self.apply(value)
+    def apply_row(self, value):
         return value
 
-    def wrap_row(self, row, value):
-        if (row, None) in self.spans:
-            value = self.apply_row(value)
-        return value
 
-    def apply_row(self, value):
-        return value
+_ESCAPE = str.maketrans(
+    {
+        "%": r"\%",
+        "#": r"\#",
+        "&": r"\&",
+        "$": r"\$",
+        "_": r"\_",
+        "{": r"\{",
+        "}": r"\}",
+    }
+)
 
 
 def quote(text):
     if not text:
         return ""
-    t = (
-        text.strip()
-        .replace("%", r"\%")
-        .replace("#", r"\#")
-        .replace("&", r"\&")
-        .replace("$", r"\$")
-        .replace("_", r"\_")
-        .replace("{", r"\{")
-        .replace("}", r"\}")
-        .replace(r"\\", r"\\\\")
-    )
-    return t
+    return text.strip().translate(_ESCAPE).replace(r"\\", r"\\\\")
 
 
 def stripnl(text):
     return text.replace("\n", " ")
 
 
-class SkippableDictReader(csv.DictReader):
+class SkippableReader:
+    """CSV reader yielding plain lists instead of a dict per row.
+
+    Like ``csv.DictReader``, blank lines are skipped and short rows are padded
+    so that every row can be indexed by column position.
+    """
+
     def __init__(self, f, start_at=0, **kwargs):
-        super().__init__(f, **kwargs)
+        self.reader = csv.reader(f, **kwargs)
         for i in range(start_at):
             next(self.reader)
+        self.fieldnames = next(self.reader)
+
+    def __iter__(self):
+        width = len(self.fieldnames)
+        for row in self.reader:
+            if not row:
+                continue
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            yield row
+
+
+@define
+class WrapperIndex:
+    """Resolves which wrappers apply to the rows and cells of a table.
+
+    Rows matched by the same set of row wrappers share the resolved lists, so
+    span membership is only checked once per row instead of once per cell.
+    Empty cells only go through the wrappers of a column if one of them
+    fills empty cells; otherwise they are left empty.
+    """
+
+    wrappers: list[WrapperBase] = field()
+    ncols: int = field()
+    _resolved: dict = field(factory=dict)
+
+    def resolve(self, row):
+        in_row = tuple((row, None) in w.spans for w in self.wrappers)
+        try:
+            return self._resolved[in_row]
+        except KeyError:
+            pass
+        row_wrappers = [w for w, r in zip(self.wrappers, in_row) if r]
+        cell_wrappers = [
+            [w for w, r in zip(self.wrappers, in_row) if r or (None, col) in w.spans]
+            for col in range(self.ncols)
+        ]
+        empty_wrappers = [
+            ws if any(w.fills_empty for w in ws) else [] for ws in cell_wrappers
+        ]
+        resolved = row_wrappers, cell_wrappers, empty_wrappers
+        self._resolved[in_row] = resolved
+        return resolved
+
+
+def columns_getter(cols):
+    """Return a callable picking ``cols`` out of a row, always as a tuple."""
+    if not cols:
+        return lambda row: ()
+    if len(cols) == 1:
+        col = cols[0]
+        return lambda row: (row[col],)
+    return itemgetter(*cols)
 
 
 def print_table(
@@ -170,33 +266,39 @@ def print_table(
     delimiter = ","
     if fh.name.endswith(".tsv"):
         delimiter = "\t"
-    data = SkippableDictReader(fh, start_at=start_at, delimiter=delimiter)
-    cols = list(cols.filter(data.fieldnames))
+    data = SkippableReader(fh, start_at=start_at, delimiter=delimiter)
+    fieldnames = data.fieldnames
+    cols = list(cols.filter(range(len(fieldnames))))
     if skip_cols:
-        cols = [c for c in cols if c not in skip_cols]
+        cols = [c for c in cols if fieldnames[c] not in skip_cols]
 
     if not skip_headers:
-        data = [dict(zip(cols, cols))] + list(data)
+        data = chain([fieldnames], data)
 
+    get_cols = columns_getter(cols)
+    wrappers = WrapperIndex(wrappers, len(cols))
     for row, data in enumerate(rows.filter(data)):
-        print_row(row, data, cols, wrappers, row_template)
+        print_row(row, get_cols(data), wrappers, row_template)
 
 
-def print_row(row, data, cols, wrappers, row_template):
-    values = []
+def print_row(row, data, wrappers, row_template):
+    row_wrappers, cell_wrappers, empty_wrappers = wrappers.resolve(row)
+    values = [None] * len(data)
     has_value = False
-    data = [data[k] for k in cols]
     for col, cell in enumerate(data):
         cell = quote(cell)
         if cell:
             has_value = True
-        for wrapper in wrappers:
-            cell = wrapper.wrap((row, col), cell)
-        values.append(cell)
+            col_wrappers = cell_wrappers[col]
+        else:
+            col_wrappers = empty_wrappers[col]
+        for wrapper in col_wrappers:
+            cell = wrapper.apply(cell)
+        values[col] = cell
     value = row_template(values, has_value)
-    for wrapper in wrappers:
-        value = wrapper.wrap_row(row, value)
-    print(value, end="")
+    for wrapper in row_wrappers:
+        value = wrapper.apply_row(value)
+    sys.stdout.write(value)
 
 
 @define
@@ -238,6 +340,7 @@ class Italic(Wrapper):
 @define
 class BackgroundColor(WrapperBase):
     priority = 10
+    fills_empty = True
     color: str = field()
 
     @classmethod
@@ -266,6 +369,10 @@ class Dot(WrapperBase):
 class CheckmarkIfValue(WrapperBase):
     value: str = field()
 
+    @property
+    def fills_empty(self):
+        return self.value == ""
+
     @classmethod
     def parse(cls, spans, args):
         return cls(value=args, spans=spans)
@@ -281,6 +388,10 @@ class CheckmarkIfValue(WrapperBase):
 class CrossmarkIfValue(WrapperBase):
     value: str = field()
 
+    @property
+    def fills_empty(self):
+        return self.value == ""
+
     @classmethod
     def parse(cls, spans, args):
         return cls(value=args, spans=spans)
@@ -292,6 +403,10 @@ class CrossmarkIfValue(WrapperBase):
             return value
 
 
+_LIST_OPEN = "\\begin{tabitemize}\n"
+_LIST_CLOSE = "\n\\end{tabitemize}"
+
+
 @define
 class List(WrapperBase):
     value: str = field()
@@ -303,13 +418,14 @@ class List(WrapperBase):
     def apply(self, value):
         if not value.strip():
             return ""
-        lines = [rf"\item {line}" for line in value.strip("- ").split("\n- ")]
-        return "\n".join([r"\begin{tabitemize}", *lines, r"\end{tabitemize}"])
+        items = value.strip("- ").split("\n- ")
+        return _LIST_OPEN + "\n".join(r"\item " + i for i in items) + _LIST_CLOSE
 
 
 @define
 class TextColor(WrapperBase):
     priority = 100
+    fills_empty = True
     color: str = field()
 
     @classmethod
@@ -320,11 +436,45 @@ class TextColor(WrapperBase):
         return rf"\color{{{self.color}}}{{{value}}}"
 
 
+_NUMBER_RE = re.compile(r"^-?([0-9]+[,.]?)+$")
+_PERCENT_RE = re.compile(r"^-?[0-9,.]+$")
+
+
+def quantum(decimals):
+    return D("1." + "0" * max(decimals, 0))
+
+
+def format_exact(value, decimals, shift=0):
+    """Format ``value * 10**shift`` with ``decimals`` places using floats.
+
+    This is only done when no digit is rounded away, the result fits in the
+    15 significant digits a float round-trips exactly and ``str(Decimal)``
+    would not switch to exponent notation (more than 6 places), so that the
+    output is the same as with ``Decimal.quantize``. Returns ``None``
+    otherwise.
+    """
+    intpart, _, frac = value.lstrip("-").partition(".")
+    if not 0 <= decimals <= 6 or len(frac) > decimals + shift:
+        return None
+    if len(intpart) + shift + decimals > 15:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return format(number * 10**shift, f".{decimals}f")
+
+
 @define
 class RoundNumbers(WrapperBase):
     priority = 200
+    fills_empty = True
     decimals: int = field()
     rounding = field()
+    _quantum: D = field(init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        self._quantum = quantum(self.decimals)
 
     @classmethod
     def parse(cls, spans, args):
@@ -335,16 +485,17 @@ class RoundNumbers(WrapperBase):
     def apply(self, value):
         if value.startswith("(") and value.endswith(")"):
             value = f"-{value[1:-1]}"
-        if re.match(r"^-?([0-9]+[,.]?)+$", value):
+        if _NUMBER_RE.match(value):
             value = value.replace(",", "")
+            formatted = format_exact(value, self.decimals)
+            if formatted is not None:
+                return formatted
             value = D(value)
             if self.decimals < 0:
                 value /= 10**-self.decimals
-                value = value.quantize(D("1."))
+                value = value.quantize(self._quantum)
             else:
-                value = value.quantize(
-                    D("1." + "0" * self.decimals), rounding=self.rounding
-                )
+                value = value.quantize(self._quantum, rounding=self.rounding)
             value = str(value)
         else:
             if value.strip() == "...":
@@ -357,15 +508,22 @@ class RoundNumbers(WrapperBase):
 class Percent(WrapperBase):
     priority = 200
     decimals: int = field()
+    _quantum: D = field(init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        self._quantum = quantum(self.decimals)
 
     @classmethod
     def parse(cls, spans, args):
         return cls(decimals=int(args), spans=spans)
 
     def apply(self, value):
-        if re.match(r"^-?[0-9,.]+$", value):
+        if _PERCENT_RE.match(value):
             value = value.replace(",", "")
-            value = (D(value) * 100).quantize(D("1." + "0" * self.decimals))
+            formatted = format_exact(value, self.decimals, shift=2)
+            if formatted is None:
+                formatted = (D(value) * 100).quantize(self._quantum)
+            value = formatted
             value = rf"\pct{{{value}}}"
         return value
 
@@ -442,6 +600,61 @@ def simple_row(values, has_value):
     return " & ".join(values) if has_value else ""
 
 
+_TRIVIAL_TEMPLATE_RE = re.compile(
+    r"(?P<prefix>.*?)<<\s*r\s*\|\s*join\((?P<q>['\"])(?P<sep>[^'\"\\]*)(?P=q)\)\s*>>"
+    r"(?P<suffix>.*)",
+    re.DOTALL,
+)
+
+
+def trivial_row(source):
+    """Return a plain Python row function for ``<<r|join(sep)>>`` templates.
+
+    Returns ``None`` if the template does anything else and has to be rendered
+    by Jinja. Newlines are normalized as Jinja does, including dropping a
+    single trailing newline.
+    """
+    source = re.sub(r"\r\n|\r", "\n", source)
+    if source.endswith("\n"):
+        source = source[:-1]
+    match = _TRIVIAL_TEMPLATE_RE.fullmatch(source)
+    if not match:
+        return None
+    prefix, sep, suffix = match.group("prefix", "sep", "suffix")
+    if any(m in prefix + suffix for m in ("<<", "<@", "{#")):
+        return None
+
+    def row(values, has_value):
+        return prefix + sep.join(values) + suffix
+
+    return row
+
+
+def jinja_row(source):
+    env = Environment(
+        loader=BaseLoader,
+        autoescape=False,
+        block_start_string="<@",
+        block_end_string="@>",
+        variable_start_string="<<",
+        variable_end_string=">>",
+    )
+    env.filters.update(
+        {
+            "escape": quote,
+            "stripnl": stripnl,
+            "replacerefs": replacerefs,
+            "glossarize": replaceglossary,
+        }
+    )
+    jtemplate = env.from_string(source)
+
+    def row(values, has_value):
+        return jtemplate.render(r=values, has_value=has_value)
+
+    return row
+
+
 @click.command()
 @click.option("-s", "--start-at", default=0)
 @click.option("-r", "--row-modifier", "row_modifiers", multiple=True)
@@ -492,6 +705,10 @@ def main(
     skip_headers,
     template,
 ):
+    # Rows are written one by one; make sure they are block buffered even
+    # when stdout is a terminal.
+    sys.stdout.reconfigure(line_buffering=False)
+
     rows = Spans.parse(rows) if rows else Spans.all()
     cols = Spans.parse(cols) if cols else Spans.all()
     skip_cols = skip_cols.split(",") if skip_cols else []
@@ -516,26 +733,8 @@ def main(
     wrappers.sort(key=lambda w: w.priority, reverse=True)
 
     if template:
-        env = Environment(
-            loader=BaseLoader,
-            autoescape=False,
-            block_start_string="<@",
-            block_end_string="@>",
-            variable_start_string="<<",
-            variable_end_string=">>",
-        )
-        env.filters.update(
-            {
-                "escape": quote,
-                "stripnl": stripnl,
-                "replacerefs": replacerefs,
-                "glossarize": replaceglossary,
-            }
-        )
-        jtemplate = env.from_string(template.read())
-
-        def template_func(values, has_value):
-            return jtemplate.render(r=values, has_value=has_value)
+        source = template.read()
+        template_func = trivial_row(source) or jinja_row(source)
     else:
         template_func = simple_row
 